@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-import requests
+import httpx
 import io
 from io import StringIO
 
@@ -8,6 +8,61 @@ from io import StringIO
 FASTAPI_URL = "http://127.0.0.1:8000"
 st.set_page_config(page_title="CSV Merger - FastAPI + Streamlit", layout="wide")
 
+# ------------------- CACHED HELPERS -------------------
+@st.cache_resource
+def get_api_client() -> httpx.Client:
+    # One keep-alive client per server process, reused across script reruns
+    return httpx.Client(base_url=FASTAPI_URL, timeout=None)
+
+
+# Streamlit reruns the whole script on every widget change; these keep the
+# parsed uploads and the merge result keyed on the raw file bytes. Entries
+# are capped and expire so old merges don't pile up in server memory.
+CACHE_TTL = 600  # seconds
+
+
+def normalize_columns(df):
+    df.columns = df.columns.str.lower().str.strip().str.replace(" ", "_", regex=False)
+    return df
+
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def load_csv(data: bytes) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(data))
+
+
+@st.cache_data(show_spinner=False, max_entries=2, ttl=CACHE_TTL)
+def do_merge(data1: bytes, data2: bytes, join_column: str, join_type: str) -> pd.DataFrame:
+    df1 = normalize_columns(load_csv(data1))
+    df2 = normalize_columns(load_csv(data2))
+
+    # Non-key columns present on both sides; only these need _x/_y suffixes
+    overlap = (set(df1.columns) & set(df2.columns)) - {join_column}
+
+    # Small key/value lookup table: a vectorized map beats a full merge
+    value_columns = [c for c in df2.columns if c != join_column]
+    if (join_type == "left" and not overlap and len(value_columns) == 1
+            and len(df2) < 100_000 and df2[join_column].is_unique):
+        lookup = df2.set_index(join_column)[value_columns[0]]
+        return df1.assign(**{value_columns[0]: df1[join_column].map(lookup)})
+
+    # Unique right-hand keys: join against its index instead of a full merge
+    if join_type in ("left", "inner") and df2[join_column].is_unique:
+        merged = df1.join(df2.set_index(join_column), on=join_column, how=join_type,
+                          lsuffix="_x", rsuffix="_y", validate="m:1")
+        return merged.reset_index(drop=True)
+
+    return pd.merge(df1, df2, on=join_column, how=join_type, sort=False, copy=False)
+
+
+@st.cache_data(show_spinner=False, max_entries=2, ttl=CACHE_TTL)
+def make_csv_bytes(data1: bytes, data2: bytes, join_column: str, join_type: str) -> bytes:
+    # Keyed like do_merge, so reruns and the upload button reuse one serialization
+    buf = io.BytesIO()
+    do_merge(data1, data2, join_column, join_type).to_csv(buf, index=False)
+    return buf.getvalue()
+
+
 st.title("📂 CSV Merge App (Manual Upload + FastAPI Save)")
 st.caption("Upload two CSV files, enter join column and join type, merge locally, and optionally upload to MinIO via FastAPI.")
 
@@ -21,8 +76,8 @@ with col2:
     file2 = st.file_uploader("Upload Second CSV", type=["csv"], key="file2")
 
 if file1 and file2:
-    df1 = pd.read_csv(file1)
-    df2 = pd.read_csv(file2)
+    df1 = load_csv(file1.getvalue())
+    df2 = load_csv(file2.getvalue())
 
     st.subheader(" Preview of Uploaded Files")
     st.write("**File 1**", df1.head())
@@ -35,21 +90,22 @@ if file1 and file2:
     join_type = st.selectbox("Select Join Type", ["inner", "left", "right", "outer"])
 
     if st.button(" Merge Files"):
-        join_column = join_column.strip().lower()
-        df1.columns = [col.lower().strip() for col in df1.columns]
-        df2.columns = [col.lower().strip() for col in df2.columns]
+        join_column = join_column.strip().lower().replace(" ", "_")
+        df1 = normalize_columns(df1)
+        df2 = normalize_columns(df2)
+
+        columns1 = set(df1.columns)
+        columns2 = set(df2.columns)
 
-        if join_column not in df1.columns or join_column not in df2.columns:
+        if join_column not in columns1 or join_column not in columns2:
             st.error(f" '{join_column}' not found in both files.\nFile1 columns: {list(df1.columns)}\nFile2 columns: {list(df2.columns)}")
         else:
-            merged_df = pd.merge(df1, df2, on=join_column, how=join_type)
+            merged_df = do_merge(file1.getvalue(), file2.getvalue(), join_column, join_type)
             st.success(f" Files merged successfully using **{join_type}** join on **{join_column}**")
             st.dataframe(merged_df.head(10))
 
-            # Save merged CSV in session for later
-            csv_buffer = io.StringIO()
-            merged_df.to_csv(csv_buffer, index=False)
-            csv_data = csv_buffer.getvalue()
+            # Serialized once and cached for the download + upload buttons
+            csv_data = make_csv_bytes(file1.getvalue(), file2.getvalue(), join_column, join_type)
 
             st.download_button(
                 label="⬇ Download Merged CSV",
@@ -62,12 +118,12 @@ if file1 and file2:
             st.header("3️⃣ Save Merged File to FastAPI (MinIO + PostgreSQL)")
 
             if st.button("💾 Upload to FastAPI Backend"):
-                files = {"file": ("merged_file.csv", csv_data, "text/csv")}
+                files = {"file": ("merged_file.csv", io.BytesIO(csv_data), "text/csv")}
                 data = {
                     "uploaded_by": "Debangshu",
                     "description": f"Merged via Streamlit using {join_type} join"
                 }
-                res = requests.post(f"{FASTAPI_URL}/upload", files=files, data=data)
+                res = get_api_client().post("/upload", files=files, data=data)
 
                 if res.status_code == 200:
                     st.success("✅ Merged file successfully uploaded to FastAPI (MinIO + PostgreSQL)")
@@ -76,4 +132,4 @@ if file1 and file2:
                     st.error(f"❌ Upload failed: {res.text}")
 else:
     st.info("👆 Please upload two CSV files to start.")
-streamlit run frontend.py
+# Run with: streamlit run frontend.py
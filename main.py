@@ -1,12 +1,29 @@
+import anyio.to_thread
+import asyncio
+import io
 import os
+import tempfile
+import threading
 import uuid
+import numpy as np
 import pandas as pd
+import cachetools
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from typing import List, Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Form
 from minio import Minio
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.decorator import cache
 from dotenv import load_dotenv
 import traceback
 
@@ -23,14 +40,73 @@ app = FastAPI(title="FastAPI File Management System (In-Memory Cache)")
 # ------------------------------------------------------
 # Connect to PostgreSQL
 # ------------------------------------------------------
-conn = psycopg2.connect(
+# Hot statements, prepared once per connection (parse/plan is skipped on EXECUTE)
+PREPARED_STATEMENTS = {
+    "get_file": "SELECT name, format, file_path FROM files2 WHERE id = $1",
+    "get_files": "SELECT id, name, format, file_path FROM files2 WHERE id = ANY($1)",
+    "insert_file": """
+        INSERT INTO files2 (name, format, size, description, uploaded_by, file_path, status)
+        VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING id
+    """,
+}
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connection that prepares PREPARED_STATEMENTS when it is opened."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self.cursor() as cur:
+            for name, sql in PREPARED_STATEMENTS.items():
+                cur.execute(f"PREPARE {name} AS {sql}")
+        self.commit()
+
+
+DB_POOL_MIN = 4
+DB_POOL_MAX = 16
+
+db_pool = psycopg2.pool.ThreadedConnectionPool(
+    DB_POOL_MIN, DB_POOL_MAX,
     dbname=os.getenv("POSTGRES_DB"),
     user=os.getenv("POSTGRES_USER"),
     password=os.getenv("POSTGRES_PASSWORD"),
     host=os.getenv("POSTGRES_HOST"),
-    port=os.getenv("POSTGRES_PORT")
+    port=os.getenv("POSTGRES_PORT"),
+    connection_factory=PreparedConnection
 )
-cursor = conn.cursor()
+
+
+# getconn() raises PoolError when all connections are out instead of waiting,
+# so callers queue here for a free slot first
+db_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+@contextmanager
+def db_cursor():
+    """Borrow a pooled connection; commits on success, rolls back on error."""
+    with db_slots:
+        conn = db_pool.getconn()
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    yield cursor
+        finally:
+            db_pool.putconn(conn)
+
+
+def lookup_files(file_ids: List[int]) -> dict:
+    """Map id -> (name, format, file_path) for the given ids in one round trip."""
+    with db_cursor() as cursor:
+        cursor.execute("EXECUTE get_files(%s)", (file_ids,))
+        return {r[0]: r[1:] for r in cursor.fetchall()}
+
+
+def insert_file(name, file_format, size, description, uploaded_by, file_path, status) -> int:
+    with db_cursor() as cursor:
+        cursor.execute("EXECUTE insert_file(%s, %s, %s, %s, %s, %s, %s)",
+                       (name, file_format, size, description, uploaded_by, file_path, status))
+        return cursor.fetchone()[0]
+
 
 # ------------------------------------------------------
 # Connect to MinIO
@@ -47,14 +123,311 @@ BUCKET = os.getenv("MINIO_BUCKET")
 if not minio_client.bucket_exists(BUCKET):
     minio_client.make_bucket(BUCKET)
 
+MIN_PART_SIZE = 64 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024           # S3 limit per part
+PARALLEL_UPLOAD_THRESHOLD = 1024 * 1024 * 1024   # more concurrent parts above 1 GiB
+PARALLEL_UPLOADS = 4
+SPOOL_MAX_SIZE = 256 * 1024 * 1024              # in-memory limit for generated files
+
+# CSVs are stored zstd-compressed as "<name>.zst" (one frame per chunk)
+ZSTD_CODEC = pa.Codec("zstd", compression_level=3)
+ZSTD_CHUNK_SIZE = 8 * 1024 * 1024
+ZSTD_SUFFIX = ".zst"
+
+
+def put_stream(object_name: str, data, size: int, **kwargs):
+    """Upload a stream of known size using large parts (parallel for big files)."""
+    part_size = min(max(MIN_PART_SIZE, size // 8), MAX_PART_SIZE)
+    if size > PARALLEL_UPLOAD_THRESHOLD:
+        kwargs.setdefault("num_parallel_uploads", PARALLEL_UPLOADS)
+    # Below the threshold minio's own default (3 parallel parts) applies
+    return minio_client.put_object(BUCKET, object_name, data, length=size,
+                                   part_size=part_size, **kwargs)
+
+
+def put_compressed(object_name: str, data) -> str:
+    """zstd-compress a CSV stream and upload it; returns the stored object name."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buf:
+        for chunk in iter(lambda: data.read(ZSTD_CHUNK_SIZE), b""):
+            buf.write(ZSTD_CODEC.compress(chunk, asbytes=True))
+        size = buf.tell()
+        buf.seek(0)
+
+        object_name += ZSTD_SUFFIX
+        put_stream(object_name, buf, size, content_type="text/csv",
+                   metadata={"Content-Encoding": "zstd"})
+    return object_name
+
+# ------------------------------------------------------
+# Arrow helpers for reading / joining datasets
+# ------------------------------------------------------
+CSV_READ_OPTIONS = pv.ReadOptions(use_threads=True, block_size=8 << 20)
+
+# Threads for MinIO downloads + parsing, so both merge inputs load concurrently
+io_pool = ThreadPoolExecutor(max_workers=8)
+
+# Separate pool for joins / serialization so CPU work can't starve I/O threads
+cpu_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# API join names -> Acero hash join names
+ARROW_JOIN_TYPES = {
+    "inner": "inner",
+    "left": "left outer",
+    "right": "right outer",
+    "outer": "full outer",
+}
+
+
+def normalize_names(names: List[str]) -> List[str]:
+    # Vectorized over all headers with Arrow string kernels
+    arr = pc.utf8_trim_whitespace(pc.utf8_lower(pa.array(names, pa.string())))
+    return pc.replace_substring(arr, " ", "_").to_pylist()
+
+
+def csv_header(data: bytes) -> List[str]:
+    # The streaming reader only parses the first block to build the schema;
+    # quoting (incl. newlines inside quoted headers) and BOM match the full read
+    return pv.open_csv(pa.BufferReader(data), read_options=CSV_READ_OPTIONS).schema.names
+
+
+def read_table(data: bytes, file_format: str, join_column: str,
+               columns: Optional[List[str]] = None, label: str = "file") -> pa.Table:
+    """Parse raw CSV / Excel bytes into an Arrow table with normalized headers.
+
+    Only the join column and the requested `columns` are converted, and the
+    join column is always read as a string so keys compare the same way in
+    both files.
+    """
+    if file_format == "csv":
+        raw_names = csv_header(data)
+    else:
+        # Arrow has no Excel reader, so go through pandas for .xlsx
+        df = pd.read_excel(io.BytesIO(data))
+        # Sheets often mix numbers and text in one column; Arrow needs one type
+        for col in df.select_dtypes(include="object").columns:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        raw_names = table.column_names
+
+    normalized = normalize_names(raw_names)
+    duplicates = sorted(n for n, count in Counter(normalized).items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=400,
+                            detail=f"Columns in {label} collide after normalization: {duplicates}")
+
+    raw_by_name = dict(zip(normalized, raw_names))
+    if join_column not in raw_by_name:
+        raise HTTPException(status_code=400,
+                            detail=f"Column '{join_column}' missing in {label}")
+
+    wanted = None
+    if columns:
+        wanted = [c.strip().lower().replace(" ", "_") for c in columns]
+        missing = [c for c in wanted if c not in raw_by_name]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown columns in {label}: {missing}")
+        wanted = [join_column] + [c for c in wanted if c != join_column]
+
+    if file_format == "csv":
+        convert_options = pv.ConvertOptions(
+            include_columns=[raw_by_name[c] for c in wanted] if wanted else None,
+            column_types={raw_by_name[join_column]: pa.string()},
+        )
+        table = pv.read_csv(pa.BufferReader(data), read_options=CSV_READ_OPTIONS,
+                            convert_options=convert_options)
+        return table.rename_columns(normalize_names(table.column_names))
+
+    table = table.rename_columns(normalize_names(raw_names))
+    if wanted:
+        table = table.select(wanted)
+    key_index = table.schema.get_field_index(join_column)
+    return table.set_column(key_index, join_column, pc.cast(table[join_column], pa.string()))
+
+
+# Parsed source tables keyed by file, etag and projection, bounded by Arrow buffer size
+SOURCE_CACHE_BYTES = 512 * 1024 * 1024
+source_cache = cachetools.LRUCache(maxsize=SOURCE_CACHE_BYTES, getsizeof=lambda t: t.nbytes)
+source_cache_lock = threading.Lock()
+
+
+def fetch_table(file_id: int, object_name: str, file_format: str, join_column: str,
+                columns: Optional[List[str]] = None) -> pa.Table:
+    """Download an object from MinIO and parse it (runs in a worker thread).
+
+    Tables are cached by (file_id, etag, join_column, columns), so repeated
+    merges of an unchanged object skip both the download and the parse.
+    """
+    etag = minio_client.stat_object(BUCKET, object_name).etag
+    key = (file_id, etag, join_column, tuple(columns) if columns else None)
+    with source_cache_lock:
+        table = source_cache.get(key)
+    if table is not None:
+        return table
+
+    obj = minio_client.get_object(BUCKET, object_name)
+    try:
+        # Raw body: .zst objects carry Content-Encoding: zstd, and urllib3 would
+        # otherwise decode them itself whenever `zstandard` is installed
+        data = obj.read(decode_content=False)
+    finally:
+        obj.close()
+        obj.release_conn()
+    if object_name.endswith(ZSTD_SUFFIX):
+        data = pa.CompressedInputStream(pa.BufferReader(data), "zstd").read()
+    table = read_table(data, file_format, join_column, columns, label=f"file ID {file_id}")
+
+    with source_cache_lock:
+        try:
+            source_cache[key] = table
+        except ValueError:
+            pass  # larger than the whole cache; just don't keep it
+    return table
+
+
+def evict_source(file_id: int):
+    with source_cache_lock:
+        for key in [k for k in source_cache if k[0] == file_id]:
+            del source_cache[key]
+
+
+# validate= option (pandas semantics) -> (left keys unique, right keys unique)
+MERGE_VALIDATIONS = {
+    "one_to_one": (True, True), "1:1": (True, True),
+    "one_to_many": (True, False), "1:m": (True, False),
+    "many_to_one": (False, True), "m:1": (False, True),
+    "many_to_many": (False, False), "m:m": (False, False),
+}
+
+
+def is_unique(table: pa.Table, column: str) -> bool:
+    return pc.count_distinct(table[column], mode="all").as_py() == table.num_rows
+
+
+# Right tables up to this size with a single value column are looked up, not joined
+LOOKUP_MAX_ROWS = 100_000
+
+
+def lookup_join(table1: pa.Table, table2: pa.Table, join_column: str) -> Optional[pa.Table]:
+    """Left join against a small key/value table via index_in + take.
+
+    Returns None when table2 is not a unique-keyed two-column lookup table.
+    The caller guarantees the value column does not clash with table1.
+    """
+    value_columns = [c for c in table2.column_names if c != join_column]
+    if (len(value_columns) != 1 or table2.num_rows >= LOOKUP_MAX_ROWS
+            or not is_unique(table2, join_column)):
+        return None
+
+    positions = pc.index_in(table1[join_column], value_set=table2[join_column].combine_chunks(),
+                            skip_nulls=True)
+    return table1.append_column(value_columns[0], pc.take(table2[value_columns[0]], positions))
+
+
+# Row-number columns used to restore a deterministic (pandas) row order
+LEFT_ROW = "__left_row"
+RIGHT_ROW = "__right_row"
+
+# Sort keys per join type: left/inner keep file 1 order, right keeps file 2
+# order, outer is sorted by key (what pd.merge does for outer joins)
+MERGE_ROW_ORDER = {
+    "inner": lambda key: [(LEFT_ROW, "ascending"), (RIGHT_ROW, "ascending")],
+    "left": lambda key: [(LEFT_ROW, "ascending"), (RIGHT_ROW, "ascending")],
+    "right": lambda key: [(RIGHT_ROW, "ascending"), (LEFT_ROW, "ascending")],
+    "outer": lambda key: [(key, "ascending"), (LEFT_ROW, "ascending"), (RIGHT_ROW, "ascending")],
+}
+
+
+def join_tables(table1: pa.Table, table2: pa.Table, join_column: str, join_type: str,
+                validate: Optional[str] = None) -> pa.Table:
+    """Validate and hash-join two tables prepared by read_table."""
+    if validate:
+        left_unique, right_unique = MERGE_VALIDATIONS[validate]
+        if left_unique and not is_unique(table1, join_column):
+            raise HTTPException(status_code=400,
+                                detail=f"Join keys are not unique in file 1; not a {validate} merge")
+        if right_unique and not is_unique(table2, join_column):
+            raise HTTPException(status_code=400,
+                                detail=f"Join keys are not unique in file 2; not a {validate} merge")
+
+    # Non-key columns present on both sides; only these need _x/_y suffixes
+    overlap = (set(table1.column_names) & set(table2.column_names)) - {join_column}
+
+    if join_type == "left" and not overlap:
+        merged = lookup_join(table1, table2, join_column)
+        if merged is not None:
+            return merged
+
+    # Acero emits rows in hash order; tag each side with its row number so
+    # the result can be put back into pandas merge order afterwards
+    table1 = table1.append_column(LEFT_ROW, pa.array(np.arange(table1.num_rows, dtype=np.int64)))
+    table2 = table2.append_column(RIGHT_ROW, pa.array(np.arange(table2.num_rows, dtype=np.int64)))
+
+    suffixes = {"left_suffix": "_x", "right_suffix": "_y"} if overlap else {}
+    merged = table1.join(table2, keys=join_column,
+                         join_type=ARROW_JOIN_TYPES[join_type], **suffixes)
+    merged = merged.sort_by(MERGE_ROW_ORDER[join_type](join_column))  # nulls sort last
+
+    # Column order as in pandas: file 1's columns, then file 2's non-key columns
+    columns = [f"{c}_x" if c in overlap else c for c in table1.column_names[:-1]]
+    columns += [f"{c}_y" if c in overlap else c
+                for c in table2.column_names[:-1] if c != join_column]
+    return merged.select(columns)
+
+
+def table_to_ipc(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ipc_to_table(data: bytes) -> pa.Table:
+    # BufferReader wraps the cached bytes without copying them
+    return pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+
+
 # ------------------------------------------------------
 # Initialize In-Memory Cache (No Redis Needed)
 # ------------------------------------------------------
+class ArrowLRU:
+    """Merged tables stored as Arrow IPC bytes, bounded by total bytes.
+
+    Entries expire after `ttl` seconds; when the byte cap is reached the
+    least recently used results are evicted first.
+    """
+
+    def __init__(self, cap_bytes: int, ttl: int):
+        self.cache = cachetools.TTLCache(maxsize=cap_bytes, ttl=ttl, getsizeof=len)
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        with self.lock:
+            data = self.cache.get(key)
+        return ipc_to_table(data) if data is not None else None
+
+    def set(self, key: str, table: pa.Table):
+        data = table_to_ipc(table)
+        with self.lock:
+            self.cache[key] = data
+
+    def clear(self, key: str):
+        with self.lock:
+            self.cache.pop(key, None)
+
+
+MERGE_CACHE_BYTES = 1024 * 1024 * 1024
+merge_cache = ArrowLRU(MERGE_CACHE_BYTES, ttl=600)
+
+
 @app.on_event("startup")
 async def startup_event():
     FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
     print(" In-memory cache initialized")
 
+    # Sync endpoints (e.g. /files) all hit PostgreSQL; don't run more of them
+    # at once than the pool has connections
+    anyio.to_thread.current_default_thread_limiter().total_tokens = DB_POOL_MAX
+
 
 # ------------------------------------------------------
 #  Upload Single File
@@ -72,25 +445,27 @@ async def upload_file(
     filename = file.filename
     file_format = filename.split(".")[-1]
 
-    # Get file size
-    file.file.seek(0, os.SEEK_END)
-    size = file.file.tell()
-    file.file.seek(0)
+    # Size is already known from the multipart parser
+    size = file.size
 
-    # Upload to MinIO
+    # Upload to MinIO (CSVs compressed; .xlsx is already a zip archive)
     try:
-        minio_client.put_object(BUCKET, filename, file.file, length=-1, part_size=10*1024*1024)
+        if file_format == "csv":
+            file_path = await asyncio.to_thread(put_compressed, filename, file.file)
+        else:
+            file_path = filename
+            await asyncio.to_thread(put_stream, filename, file.file, size)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"MinIO upload failed: {e}")
 
-    # Insert metadata
-    cursor.execute("""
-        INSERT INTO files2 (name, format, size, description, uploaded_by, file_path, status)
-        VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
-    """, (filename, file_format, size, description, uploaded_by, filename, "active"))
-    
-    conn.commit()
-    file_id = cursor.fetchone()[0]
+    # Insert metadata (drop the stored object again if that fails)
+    try:
+        file_id = await asyncio.to_thread(insert_file, filename, file_format, size,
+                                          description, uploaded_by, file_path, "active")
+    except Exception as e:
+        await asyncio.to_thread(minio_client.remove_object, BUCKET, file_path)
+        raise HTTPException(status_code=500, detail=f"Metadata insert failed: {e}")
+    await FastAPICache.clear(namespace="files")
 
     return {"message": "File uploaded successfully ✅", "file_id": file_id}
 
@@ -99,12 +474,14 @@ async def upload_file(
 #  List Active Files
 # ------------------------------------------------------
 @app.get("/files")
+@cache(expire=5, namespace="files")
 def list_files():
-    cursor.execute("""
-        SELECT id, name, format, size, uploaded_by, status, upload_time
-        FROM files2 WHERE status != 'deleted' ORDER BY id ASC;
-    """)
-    files = cursor.fetchall()
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT id, name, format, size, uploaded_by, status, upload_time
+            FROM files2 WHERE status != 'deleted' ORDER BY id ASC;
+        """)
+        files = cursor.fetchall()
 
     return [
         {
@@ -128,55 +505,61 @@ async def merge_files(
     file1_id: int,
     file2_id: int,
     join_column: str = "customer_id",
-    join_type: str = "inner"
+    join_type: str = "inner",
+    columns1: Optional[List[str]] = Query(None),
+    columns2: Optional[List[str]] = Query(None),
+    validate: Optional[str] = None
 ):
 
     valid_joins = ["inner", "left", "right", "outer"]
     if join_type not in valid_joins:
         raise HTTPException(status_code=400, detail=f"Invalid join type: {valid_joins}")
 
-    # Get file details
-    cursor.execute("SELECT name, format FROM files2 WHERE id=%s", (file1_id,))
-    f1 = cursor.fetchone()
+    if validate and validate not in MERGE_VALIDATIONS:
+        raise HTTPException(status_code=400,
+                            detail=f"Invalid validate option: {list(MERGE_VALIDATIONS)}")
+
+    # Get file details (one round trip for both files)
+    rows = await asyncio.to_thread(lookup_files, [file1_id, file2_id])
 
-    cursor.execute("SELECT name, format FROM files2 WHERE id=%s", (file2_id,))
-    f2 = cursor.fetchone()
+    f1 = rows.get(file1_id)
+    f2 = rows.get(file2_id)
 
     if not f1 or not f2:
         raise HTTPException(status_code=404, detail="One or both files not found")
 
-    try:
-        # Read from MinIO
-        f1_obj = minio_client.get_object(BUCKET, f1[0])
-        f2_obj = minio_client.get_object(BUCKET, f2[0])
-
-        df1 = pd.read_csv(f1_obj) if f1[1] == "csv" else pd.read_excel(f1_obj)
-        df2 = pd.read_csv(f2_obj) if f2[1] == "csv" else pd.read_excel(f2_obj)
+    join_column = join_column.strip().lower().replace(" ", "_")
 
-        f1_obj.close()
-        f2_obj.close()
-
-        # Normalize columns
-        df1.columns = [c.lower().replace(" ", "_") for c in df1.columns]
-        df2.columns = [c.lower().replace(" ", "_") for c in df2.columns]
-        join_column = join_column.lower()
-
-        if join_column not in df1.columns or join_column not in df2.columns:
-            raise HTTPException(status_code=400,
-                                detail=f"Column '{join_column}' missing in both files")
+    try:
+        # Read from MinIO (both files in parallel), parsing only the needed columns
+        loop = asyncio.get_running_loop()
+        table1, table2 = await asyncio.gather(
+            loop.run_in_executor(io_pool, fetch_table, file1_id, f1[2], f1[1], join_column, columns1),
+            loop.run_in_executor(io_pool, fetch_table, file2_id, f2[2], f2[1], join_column, columns2),
+        )
 
-        merged_df = pd.merge(df1, df2, on=join_column, how=join_type)
+        merged = await loop.run_in_executor(cpu_pool, join_tables, table1, table2,
+                                            join_column, join_type, validate)
 
+        message = f"Merged using '{join_type}' join on '{join_column}'"
         cache_key = str(uuid.uuid4())
-        cache = FastAPICache.get_backend()
-        await cache.set(cache_key, merged_df.to_json(), expire=600)
+        try:
+            await loop.run_in_executor(cpu_pool, merge_cache.set, cache_key, merged)
+        except ValueError:
+            # Larger than the whole merge cache: still show the preview
+            cache_key = None
+            message += " (result too large to cache, so it can't be saved)"
+
+        preview = merged.slice(0, 5).to_pandas(split_blocks=True, self_destruct=True)
 
         return {
-            "message": f"Merged using '{join_type}' join on '{join_column}'",
-            "preview": merged_df.head().to_dict(orient="records"),   
+            "message": message,
+            "preview": preview.to_dict(orient="records"),
             "cache_key": cache_key
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Merge error: {e}")
@@ -185,36 +568,38 @@ async def merge_files(
 # ------------------------------------------------------
 #  Save Merged Dataset Permanently
 # ------------------------------------------------------
+def store_merged(merged: pa.Table, filename: str):
+    # Serialize in memory; only very large merges spill to a temp file
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buf:
+        pv.write_csv(merged, buf)
+        size = buf.tell()
+        buf.seek(0)
+
+        file_path = put_compressed(filename, buf)
+        try:
+            insert_file(filename, "csv", size, "Merged dataset", "System", file_path, "merged")
+        except Exception:
+            minio_client.remove_object(BUCKET, file_path)
+            raise
+
+
 @app.post("/save_merged")
 async def save_merged(cache_key: str):
 
-    cache = FastAPICache.get_backend()
-    merged_json = await cache.get(cache_key)
+    merged = merge_cache.get(cache_key)
 
-    if not merged_json:
+    if merged is None:
         raise HTTPException(status_code=404, detail="Cache key expired or missing")
 
-    merged_df = pd.read_json(merged_json)
     filename = f"merged_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    merged_df.to_csv(filename, index=False)
 
     try:
-        minio_client.fput_object(BUCKET, filename, filename)
-
-        cursor.execute("""
-            INSERT INTO files2 (name, format, size, description, uploaded_by, file_path, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (filename, "csv", os.path.getsize(filename),
-              "Merged dataset", "System", filename, "merged"))
-
-        conn.commit()
-
+        await asyncio.to_thread(store_merged, merged, filename)
     except Exception as e:
-        os.remove(filename)
         raise HTTPException(status_code=500, detail=f"Save failed: {e}")
 
-    await cache.clear(cache_key)
-    os.remove(filename)
+    merge_cache.clear(cache_key)
+    await FastAPICache.clear(namespace="files")
 
     return {"message": "Merged file saved successfully ", "file_name": filename}
 
@@ -222,23 +607,30 @@ async def save_merged(cache_key: str):
 # ------------------------------------------------------
 #  DELETE File (MinIO + Database)
 # ------------------------------------------------------
-@app.delete("/delete/{file_id}")
-async def delete_file(file_id: int):
-    try:
-        cursor.execute("SELECT file_path FROM files2 WHERE id=%s", (file_id,))
+def remove_file(file_id: int):
+    with db_cursor() as cursor:
+        cursor.execute("EXECUTE get_file(%s)", (file_id,))
         result = cursor.fetchone()
 
         if not result:
             raise HTTPException(status_code=404, detail="File not found")
 
-        file_path = result[0]
+        file_path = result[2]
 
         # Delete from MinIO
         minio_client.remove_object(BUCKET, file_path)
 
         # Delete DB row
         cursor.execute("DELETE FROM files2 WHERE id=%s", (file_id,))
-        conn.commit()
+
+    evict_source(file_id)
+
+
+@app.delete("/delete/{file_id}")
+async def delete_file(file_id: int):
+    try:
+        await asyncio.to_thread(remove_file, file_id)
+        await FastAPICache.clear(namespace="files")
 
         return {"message": f"File deleted and removed from DB (ID {file_id})"}
 